@@ -36,21 +36,25 @@ def get_loaders(args, dataset, splits, directed):
             wandb.log({"seal_preprocessing_time": time.time() - t0})
 
     dl = DataLoader if args.model in {'ELPH', 'BUDDY'} else pygDataLoader
+    # pinned host memory lets the batches be copied to the GPU asynchronously with non_blocking=True
+    pin_memory = torch.cuda.is_available()
+    persistent_workers = args.num_workers > 0
     train_loader = dl(train_dataset, batch_size=args.batch_size,
-                      shuffle=True, num_workers=args.num_workers)
+                      shuffle=True, num_workers=args.num_workers, pin_memory=pin_memory,
+                      persistent_workers=persistent_workers)
     # as the val and test edges are often sampled they also need to be shuffled
     # the citation2 dataset has specific negatives for each positive and so can't be shuffled
     shuffle_val = False if args.dataset_name.startswith('ogbl-citation') else True
     val_loader = dl(val_dataset, batch_size=args.batch_size, shuffle=shuffle_val,
-                    num_workers=args.num_workers)
+                    num_workers=args.num_workers, pin_memory=pin_memory, persistent_workers=persistent_workers)
     shuffle_test = False if args.dataset_name.startswith('ogbl-citation') else True
     test_loader = dl(test_dataset, batch_size=args.batch_size, shuffle=shuffle_test,
-                     num_workers=args.num_workers)
+                     num_workers=args.num_workers, pin_memory=pin_memory, persistent_workers=persistent_workers)
     if (args.dataset_name == 'ogbl-citation2') and (args.model in {'ELPH', 'BUDDY'}):
         train_eval_loader = dl(
             make_train_eval_data(args, train_dataset, train_data.num_nodes,
                                  n_pos_samples=5000), batch_size=args.batch_size, shuffle=False,
-            num_workers=args.num_workers)
+            num_workers=args.num_workers, pin_memory=pin_memory, persistent_workers=persistent_workers)
     else:
         # todo change this so that eval doesn't have to use the full training set
         train_eval_loader = train_loader
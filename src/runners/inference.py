@@ -1,11 +1,12 @@
 """
 testing / inference functions
 """
+import contextlib
+import copy
 import time
 from math import inf
 
 import torch
-from torch.utils.data import DataLoader
 from tqdm import tqdm
 import wandb
 import numpy as np
@@ -15,26 +16,52 @@ from src.utils import get_num_samples
 
 
 def get_test_func(model_str):
-    if model_str == 'ELPH':
-        return get_elph_preds
-    elif model_str == 'BUDDY':
-        return get_buddy_preds
-    else:
-        return get_preds
+    """
+    resolve the prediction function for this model. A plain table lookup, resolved once per test() call
+    :param model_str: args.model
+    :return: the per-split prediction function
+    """
+    return _TEST_FUNCS.get(model_str, get_preds)
+
+
+def _maybe_compile(model, args):
+    """
+    wrap the model with torch.compile when --torch_compile is set. mode='reduce-overhead' captures the
+    many small per-batch kernel launches into a CUDA graph that is replayed each batch. The wrapper is
+    cached on the model so repeated test() calls reuse the compiled artefacts
+    :param model: pytorch model
+    :param args: Namespace object
+    :return: the compiled model, or the model unchanged if compilation is off or unsupported
+    """
+    if not getattr(args, 'torch_compile', False) or not hasattr(torch, 'compile'):
+        return model
+    # stash the wrapper in __dict__ directly: nn.Module.__setattr__ would register it as a child
+    # module and, as the wrapper holds the model as its own child, send train()/state_dict() into
+    # infinite recursion
+    compiled = model.__dict__.get('_compiled_model')
+    if compiled is None:
+        compiled = torch.compile(model, mode='reduce-overhead')
+        model.__dict__['_compiled_model'] = compiled
+    return compiled
 
 
-@torch.no_grad()
+@torch.inference_mode()
 def test(model, evaluator, train_loader, val_loader, test_loader, args, device, emb=None, eval_metric='hits'):
     print('starting testing')
     t0 = time.time()
     model.eval()
+    model = _maybe_compile(model, args)
     print("get train predictions")
     test_func = get_test_func(args.model)
-    pos_train_pred, neg_train_pred, train_pred, train_true = test_func(model, train_loader, device, args, split='train')
+    # memoise propagated node embeddings for splits that share a message passing graph
+    kwargs = {'emb_cache': {}} if args.model in {'ELPH', 'BUDDY'} else {}
+    pos_train_pred, neg_train_pred, train_pred, train_true = test_func(model, train_loader, device, args, split='train',
+                                                                       **kwargs)
     print("get val predictions")
-    pos_val_pred, neg_val_pred, val_pred, val_true = test_func(model, val_loader, device, args, split='val')
+    pos_val_pred, neg_val_pred, val_pred, val_true = test_func(model, val_loader, device, args, split='val', **kwargs)
     print("get test predictions")
-    pos_test_pred, neg_test_pred, test_pred, test_true = test_func(model, test_loader, device, args, split='test')
+    pos_test_pred, neg_test_pred, test_pred, test_true = test_func(model, test_loader, device, args, split='test',
+                                                                   **kwargs)
 
     if eval_metric == 'hits':
         results = evaluate_hits(evaluator, pos_train_pred, neg_train_pred, pos_val_pred, neg_val_pred, pos_test_pred,
@@ -51,92 +78,384 @@ def test(model, evaluator, train_loader, val_loader, test_loader, args, device,
     return results
 
 
-@torch.no_grad()
+@torch.inference_mode()
 def get_preds(model, loader, device, args, emb=None, split=None):
     n_samples = get_split_samples(split, args, len(loader.dataset))
-    y_pred, y_true = [], []
+    # write each batch straight into preallocated output tensors rather than accumulating a python
+    # list and paying for a full copy in torch.cat at the end
+    pred = torch.empty(len(loader.dataset), dtype=torch.float, pin_memory=device.type == 'cuda')
+    true = torch.empty(len(loader.dataset), dtype=torch.float)
+    d2h_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+    n_preds = 0
     pbar = tqdm(loader, ncols=70)
-    if args.wandb:
-        wandb.log({f"inference_{split}_total_batches": len(loader)})
     batch_processing_times = []
+    amp_ctx = _eval_autocast(args, device)
     t0 = time.time()
     for batch_count, data in enumerate(pbar):
-        start_time = time.time()
+        if args.profile_batches:
+            start_time = time.time()
         # todo this should not get hit, refactor out the if statement
         if args.model == 'BUDDY':
-            data_dev = [elem.squeeze().to(device) for elem in data]
-            logits = model(*data_dev[:-1])
-            y_true.append(data[-1].view(-1).cpu().to(torch.float))
+            data_dev = [elem.squeeze().to(device, non_blocking=True) for elem in data]
+            with amp_ctx:
+                logits = model(*data_dev[:-1])
+            batch_true = data[-1].view(-1)
         else:
-            data = data.to(device)
+            # read the labels while the batch is still on the host; after the transfer this would be
+            # a blocking D2H copy per batch that defeats the async prediction pipeline
+            batch_true = data.y.view(-1)
+            data = data.to(device, non_blocking=True)
             x = data.x if args.use_feature else None
             edge_weight = data.edge_weight if args.use_edge_weight else None
             node_id = data.node_id if emb else None
-            logits = model(data.z, data.edge_index, data.batch, x, edge_weight, node_id, data.src_degree,
-                           data.dst_degree)
-            y_true.append(data.y.view(-1).cpu().to(torch.float))
-        y_pred.append(logits.view(-1).cpu())
-        batch_processing_times.append(time.time() - start_time)
+            with amp_ctx:
+                logits = model(data.z, data.edge_index, data.batch, x, edge_weight, node_id, data.src_degree,
+                               data.dst_degree)
+        true[n_preds:n_preds + batch_true.numel()].copy_(batch_true)
+        n_preds = _stage_preds_to_host(logits, pred, n_preds, d2h_stream)
+        if args.profile_batches:
+            batch_processing_times.append(time.time() - start_time)
         if (batch_count + 1) * args.batch_size > n_samples:
-            del data
-            torch.cuda.empty_cache()
             break
-        del data
-        torch.cuda.empty_cache()
+    if d2h_stream is not None:
+        d2h_stream.synchronize()
     if args.wandb:
-        wandb.log({f"inference_{split}_batch_time": np.mean(batch_processing_times)})
-        wandb.log({f"inference_{split}_epoch_time": time.time() - t0})
+        # one wandb call per split so the fixed logging overhead is paid once, not per metric
+        log_dict = {f"inference_{split}_epoch_time": time.time() - t0,
+                    f"inference_{split}_total_batches": len(loader)}
+        if batch_processing_times:
+            log_dict[f"inference_{split}_batch_time"] = np.mean(batch_processing_times)
+        wandb.log(log_dict)
 
-    pred, true = torch.cat(y_pred), torch.cat(y_true)
-    pos_pred = pred[true == 1]
-    neg_pred = pred[true == 0]
+    pred, true = pred[:n_preds], true[:n_preds]
+    # labels are {0, 1} so a single bool cast replaces two full-length == scans
+    mask = true.bool()
+    pos_pred = pred[mask]
+    neg_pred = pred[~mask]
     samples_used = len(loader.dataset) if n_samples > len(loader.dataset) else n_samples
     print(f'{len(pos_pred)} positives and {len(neg_pred)} negatives for sample of {samples_used} edges')
     return pos_pred, neg_pred, pred, true
 
 
-@torch.no_grad()
-def get_buddy_preds(model, loader, device, args, split=None):
+def _batched_arange(n, batch_size):
+    """
+    yield sequential index tensors covering [0, n) in chunks of batch_size. Equivalent to iterating
+    DataLoader(range(n), batch_size, shuffle=False) but without the worker and collate overhead
+    :param n: total number of indices
+    :param batch_size: chunk size
+    """
+    for start in range(0, n, batch_size):
+        yield torch.arange(start, min(start + batch_size, n))
+
+
+def _hydrate_link_batch(data, links, indices, args):
+    """
+    gather everything the BUDDY predictor needs for one batch of links. All tensors stay on the host
+    :param data: dataset object with subgraph_features, x, degrees and RA for every link
+    :param links: [n_edges, 2] tensor of (src, dst) node indices
+    :param indices: 1D tensor of link indices forming this batch
+    :param args: Namespace object
+    :return: curr_links, subgraph_features, node_features, degrees, RA (RA is None unless args.use_RA)
+    """
+    # index_select on a contiguous dim 0 is faster than fancy indexing as no mask is materialised
+    curr_links = links.index_select(0, indices)
+    flat_links = curr_links.view(-1)
+    if args.use_struct_feature:
+        subgraph_features = data.subgraph_features.index_select(0, indices)
+    else:
+        subgraph_features = torch.zeros((len(indices),) + data.subgraph_features.shape[1:], device=indices.device)
+    node_features = data.x.index_select(0, flat_links).view(len(indices), 2, -1)
+    degrees = data.degrees.index_select(0, flat_links).view(len(indices), 2)
+    RA = data.RA.index_select(0, indices) if args.use_RA else None
+    return curr_links, subgraph_features, node_features, degrees, RA
+
+
+def _move_dataset_to_device(data, links, args, device):
+    """
+    move the tensors needed for BUDDY inference onto the device once, provided they fit comfortably
+    into free device memory. Per-batch gathers then run on device and the per-batch H2D copies disappear
+    :param data: dataset object
+    :param links: [n_edges, 2] tensor of (src, dst) node indices
+    :param args: Namespace object
+    :param device: CUDA torch device
+    :return: (data, links, True) with device resident tensors, or the untouched inputs and False
+    """
+    tensors = {'x': data.x, 'degrees': data.degrees}
+    if args.use_struct_feature:
+        tensors['subgraph_features'] = data.subgraph_features
+    if args.use_RA:
+        tensors['RA'] = data.RA
+    total_bytes = links.element_size() * links.numel() + sum(
+        tensor.element_size() * tensor.numel() for tensor in tensors.values())
+    free_bytes, _ = torch.cuda.mem_get_info(device)
+    if total_bytes > free_bytes * 0.5:  # leave headroom for activations
+        return data, links, False
+    data = copy.copy(data)  # shallow copy so the host dataset keeps its tensors
+    for name, tensor in tensors.items():
+        setattr(data, name, tensor.to(device, non_blocking=True))
+    return data, links.to(device, non_blocking=True), True
+
+
+def _prefetch_link_batches(data, links, index_batches, args, device):
+    """
+    generate device resident BUDDY batches as (curr_links, subgraph_features, node_features, degrees, RA) tuples.
+    On CUDA devices the source tensors are moved to the device up front when they fit, so batches are
+    gathered in place with no per-batch copies. Failing that, batches are staged through two pinned
+    ping-pong buffers on a dedicated copy stream, so that batch k+1's host gather and H2D copy overlap
+    batch k's forward pass (double buffering). On other devices batches are moved synchronously
+    :param data: dataset object
+    :param links: [n_edges, 2] tensor of (src, dst) node indices
+    :param index_batches: iterable of 1D tensors of link indices
+    :param args: Namespace object
+    :param device: torch device
+    """
+    if device.type != 'cuda':
+        for indices in index_batches:
+            yield tuple(None if elem is None else elem.to(device)
+                        for elem in _hydrate_link_batch(data, links, indices, args))
+        return
+    data, links, on_device = _move_dataset_to_device(data, links, args, device)
+    if on_device:
+        for indices in index_batches:
+            yield _hydrate_link_batch(data, links, indices.to(device, non_blocking=True), args)
+        return
+    copy_stream = torch.cuda.Stream(device)
+    # one pinned staging buffer per tensor per slot, lazily sized to the first (largest) batch
+    buffers = [{}, {}]
+    copy_done = [None, None]
+
+    def stage(batch_count, indices):
+        slot = batch_count % 2
+        batch = _hydrate_link_batch(data, links, indices, args)
+        n = len(indices)
+        if copy_done[slot] is not None:
+            # the previous copy out of this pinned slot must finish before the host overwrites it
+            copy_done[slot].synchronize()
+        # all the float tensors are packed into one contiguous row per link so that the whole batch
+        # moves in a single cudaMemcpy instead of one launch per tensor
+        float_parts = [(pos, tensor) for pos, tensor in enumerate(batch)
+                       if tensor is not None and tensor.dtype == torch.float]
+        widths = [tensor.numel() // n for _, tensor in float_parts]
+        dev_batch = [None] * len(batch)
+        with torch.cuda.stream(copy_stream):
+            pinned = buffers[slot].get('packed')
+            if pinned is None or pinned.shape[0] < n or pinned.shape[1] != sum(widths):
+                pinned = torch.empty((n, sum(widths)), dtype=torch.float, pin_memory=True)
+                buffers[slot]['packed'] = pinned
+            col = 0
+            for (pos, tensor), width in zip(float_parts, widths):
+                pinned[:n, col:col + width].copy_(tensor.reshape(n, width))
+                col += width
+            packed_dev = pinned[:n].to(device, non_blocking=True)
+            col = 0
+            for (pos, tensor), width in zip(float_parts, widths):
+                dev_batch[pos] = packed_dev[:, col:col + width].reshape((n,) + tensor.shape[1:])
+                col += width
+            for pos, tensor in enumerate(batch):
+                if tensor is None or tensor.dtype == torch.float:
+                    continue
+                pinned = buffers[slot].get(pos)
+                if pinned is None or len(pinned) < len(tensor):
+                    pinned = torch.empty(tensor.shape, dtype=tensor.dtype, pin_memory=True)
+                    buffers[slot][pos] = pinned
+                staging = pinned[:len(tensor)]
+                staging.copy_(tensor)
+                dev_batch[pos] = staging.to(device, non_blocking=True)
+        copy_done[slot] = copy_stream.record_event()
+        return tuple(dev_batch), copy_done[slot]
+
+    def ready(dev_batch, event):
+        compute_stream = torch.cuda.current_stream(device)
+        compute_stream.wait_event(event)
+        for tensor in dev_batch:
+            if tensor is not None:
+                # the device blocks were allocated on copy_stream; record the consuming stream so
+                # the caching allocator cannot hand them back to copy_stream for a later batch's
+                # copy while the forward that reads them is still queued
+                tensor.record_stream(compute_stream)
+        return dev_batch
+
+    prefetched = None
+    for batch_count, indices in enumerate(index_batches):
+        staged = stage(batch_count, indices)
+        if prefetched is not None:
+            yield ready(*prefetched)
+        prefetched = staged
+    if prefetched is not None:
+        yield ready(*prefetched)
+
+
+def _get_eval_batch_size(data, args, device):
+    """
+    scale the eval batch size to the device. Fixed per-batch launch overhead is amortised by the
+    largest batch that fits, so on CUDA the size is estimated from free device memory and the
+    per-link byte width, capped by --eval_batch_size_max. The user's --eval_batch_size is a floor:
+    the estimate only ever scales it up. Off-GPU the configured size is kept
+    :param data: dataset object
+    :param args: Namespace object
+    :param device: torch device
+    :return: int batch size
+    """
+    if device.type != 'cuda':
+        return args.eval_batch_size
+    free_bytes, _ = torch.cuda.mem_get_info(device)
+    # per-link fp32 width: two endpoint feature rows + two degrees (+ struct features + RA)
+    width = 2 * data.x.shape[1] + 2
+    if args.use_struct_feature and data.subgraph_features is not None:
+        width += data.subgraph_features.shape[1]
+    if args.use_RA:
+        width += 1
+    # keep 40% of free memory back for activations and the double buffers
+    batch_size = int(free_bytes * 0.6 / (width * 4))
+    return max(args.eval_batch_size, min(args.eval_batch_size_max, batch_size))
+
+
+def _run_shrinking_on_oom(run, batch_size, floor):
+    """
+    drive an eval loop with OOM backoff. The auto-tuned eval batch size only models input widths,
+    not predictor activations or the hashing intermediates, so it can over-estimate; on CUDA OOM
+    the batch size is halved (never below the user configured floor) and the loop restarted
+    :param run: callable running the full eval loop for a given batch size
+    :param batch_size: batch size for the first attempt
+    :param floor: smallest batch size to retry with; a failure at or below it is re-raised
+    :return: whatever run returns
+    """
+    while True:
+        try:
+            return run(batch_size)
+        except torch.cuda.OutOfMemoryError:
+            if batch_size <= floor:
+                raise
+            batch_size = max(floor, batch_size // 2)
+            torch.cuda.empty_cache()
+            print(f'eval ran out of GPU memory; retrying with eval batch size {batch_size}')
+
+
+def _eval_autocast(args, device):
+    """
+    autocast context for eval forwards. bf16 halves activation bandwidth, which roughly halves the
+    time of memory bound kernels and allows larger eval batches; the MLP predictor and GCN layers
+    tolerate bf16 at eval time. Logits are cast back to float before they reach the evaluators
+    :param args: Namespace object
+    :param device: torch device
+    :return: a bf16 autocast context on supporting CUDA devices, otherwise a null context
+    """
+    if args.eval_bf16 and device.type == 'cuda' and torch.cuda.is_bf16_supported():
+        return torch.autocast(device_type='cuda', dtype=torch.bfloat16)
+    return contextlib.nullcontext()
+
+
+def _get_embedding(model, data, args, device, emb_cache=None):
+    """
+    get the (optionally SIGN propagated) node embedding to use for this split. Propagation runs a full
+    GCN diffusion over the split's message passing graph, so when a cache dict is passed the result is
+    memoised on the identity of the split's edge_index and reused across eval calls that share it
+    :param model: pytorch model with a node_embedding attribute
+    :param data: dataset object for this split
+    :param args: Namespace object
+    :param device: torch device
+    :param emb_cache: dict to memoise propagated embeddings in, or None to always recompute
+    :return: Float Tensor [n_nodes, embedding_dim] or None if the model has no node embedding
+    """
+    if model.node_embedding is None:
+        return None
+    if not args.propagate_embeddings:
+        return model.node_embedding.weight
+    key = id(data.edge_index)
+    if emb_cache is not None and key in emb_cache:
+        return emb_cache[key]
+    emb = model.propagate_embeddings_func(data.edge_index.to(device))
+    if emb_cache is not None:
+        emb_cache[key] = emb
+    return emb
+
+
+def _get_labels(data):
+    """
+    the datasets store labels as a python list, so building a tensor from them is O(n_edges) python
+    work. Build it once with as_tensor (no copy if the labels are already array-like) and cache it
+    on the dataset for subsequent eval calls
+    :param data: dataset object with a labels attribute
+    :return: Long Tensor [n_edges] of {0, 1} labels
+    """
+    if not hasattr(data, '_labels_t'):
+        data._labels_t = data.labels if torch.is_tensor(data.labels) else torch.as_tensor(data.labels)
+    return data._labels_t
+
+
+def _get_label_mask(data):
+    """
+    bool positive-link mask over the cached labels tensor. Cached on the dataset like the labels so
+    repeated eval calls slice it instead of rescanning the full label tensor
+    :param data: dataset object with a labels attribute
+    :return: Bool Tensor [n_edges], True for positive links
+    """
+    if not hasattr(data, '_labels_mask'):
+        data._labels_mask = _get_labels(data).bool()
+    return data._labels_mask
+
+
+def _stage_preds_to_host(logits, pred, start, d2h_stream):
+    """
+    copy one batch of logits into the host output buffer. On CUDA the copy is issued on a dedicated
+    D2H stream once the compute stream's work is done, so it overlaps the next batch's forward and
+    the loop only synchronises once at the end
+    :param logits: [batch_size] tensor of model outputs
+    :param pred: preallocated host output buffer (pinned on CUDA)
+    :param start: index of the first row to write
+    :param d2h_stream: CUDA stream for D2H copies, or None off-GPU
+    :return: index one past the last row written
+    """
+    end = start + logits.numel()
+    if d2h_stream is not None:
+        d2h_stream.wait_event(torch.cuda.current_stream().record_event())
+        with torch.cuda.stream(d2h_stream):
+            pred[start:end].copy_(logits.view(-1), non_blocking=True)
+        # stop the caching allocator reusing the logits block before the async copy drains
+        logits.record_stream(d2h_stream)
+    else:
+        pred[start:end].copy_(logits.view(-1))
+    return end
+
+
+@torch.inference_mode()
+def get_buddy_preds(model, loader, device, args, split=None, emb_cache=None):
     n_samples = get_split_samples(split, args, len(loader.dataset))
     t0 = time.time()
-    preds = []
     data = loader.dataset
     # hydrate edges
     links = data.links
-    labels = torch.tensor(data.labels)
-    loader = DataLoader(range(len(links)), args.eval_batch_size,
-                        shuffle=False)  # eval batch size should be the largest that fits on GPU
-    if model.node_embedding is not None:
-        if args.propagate_embeddings:
-            emb = model.propagate_embeddings_func(data.edge_index.to(device))
-        else:
-            emb = model.node_embedding.weight
-    else:
-        emb = None
-    for batch_count, indices in enumerate(tqdm(loader)):
-        curr_links = links[indices]
-        batch_emb = None if emb is None else emb[curr_links].to(device)
-        if args.use_struct_feature:
-            subgraph_features = data.subgraph_features[indices].to(device)
-        else:
-            subgraph_features = torch.zeros(data.subgraph_features[indices].shape).to(device)
-        node_features = data.x[curr_links].to(device)
-        degrees = data.degrees[curr_links].to(device)
-        if args.use_RA:
-            RA = data.RA[indices].to(device)
-        else:
-            RA = None
-        logits = model(subgraph_features, node_features, degrees[:, 0], degrees[:, 1], RA, batch_emb)
-        preds.append(logits.view(-1).cpu())
-        if (batch_count + 1) * args.eval_batch_size > n_samples:
-            break
+    labels = _get_labels(data)
+    emb = _get_embedding(model, data, args, device, emb_cache)
+    pred = torch.empty(len(links), dtype=torch.float, pin_memory=device.type == 'cuda')
+    d2h_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+    amp_ctx = _eval_autocast(args, device)
+
+    def run(eval_batch_size):
+        n_batches = (len(links) + eval_batch_size - 1) // eval_batch_size
+        batches = _prefetch_link_batches(data, links, _batched_arange(len(links), eval_batch_size), args, device)
+        n_preds = 0
+        for batch_count, (curr_links, subgraph_features, node_features, degrees, RA) in enumerate(
+                tqdm(batches, total=n_batches)):
+            batch_emb = None if emb is None else emb.index_select(0, curr_links.view(-1)).view(len(curr_links), 2, -1)
+            with amp_ctx:
+                logits = model(subgraph_features, node_features, degrees[:, 0], degrees[:, 1], RA, batch_emb)
+            n_preds = _stage_preds_to_host(logits, pred, n_preds, d2h_stream)
+            if (batch_count + 1) * eval_batch_size > n_samples:
+                break
+        return n_preds
 
+    # eval batch size should be the largest that fits on GPU
+    n_preds = _run_shrinking_on_oom(run, _get_eval_batch_size(data, args, device), args.eval_batch_size)
+    if d2h_stream is not None:
+        d2h_stream.synchronize()
     if args.wandb:
         wandb.log({f"inference_{split}_epoch_time": time.time() - t0})
-    pred = torch.cat(preds)
+    pred = pred[:n_preds]
     labels = labels[:len(pred)]
-    pos_pred = pred[labels == 1]
-    neg_pred = pred[labels == 0]
+    mask = _get_label_mask(data)[:len(pred)]
+    pos_pred = pred[mask]
+    neg_pred = pred[~mask]
     return pos_pred, neg_pred, pred, labels
 
 
@@ -163,43 +482,55 @@ def get_split_samples(split, args, dataset_len):
     return samples
 
 
-@torch.no_grad()
-def get_elph_preds(model, loader, device, args, split=None):
+@torch.inference_mode()
+def get_elph_preds(model, loader, device, args, split=None, emb_cache=None):
     n_samples = get_split_samples(split, args, len(loader.dataset))
     t0 = time.time()
-    preds = []
     data = loader.dataset
     # hydrate edges
     links = data.links
-    labels = torch.tensor(data.labels)
-    loader = DataLoader(range(len(links)), args.eval_batch_size,
-                        shuffle=False)  # eval batch size should be the largest that fits on GPU
+    labels = _get_labels(data)
+    pred = torch.empty(len(links), dtype=torch.float, pin_memory=device.type == 'cuda')
+    d2h_stream = torch.cuda.Stream(device) if device.type == 'cuda' else None
+    amp_ctx = _eval_autocast(args, device)
     # get node features
-    if model.node_embedding is not None:
-        if args.propagate_embeddings:
-            emb = model.propagate_embeddings_func(data.edge_index.to(device))
-        else:
-            emb = model.node_embedding.weight
-    else:
-        emb = None
+    emb = _get_embedding(model, data, args, device, emb_cache)
     node_features, hashes, cards = model(data.x.to(device), data.edge_index.to(device))
-    for batch_count, indices in enumerate(tqdm(loader)):
-        curr_links = links[indices].to(device)
-        batch_emb = None if emb is None else emb[curr_links].to(device)
-        if args.use_struct_feature:
-            subgraph_features = model.elph_hashes.get_subgraph_features(curr_links, hashes, cards).to(device)
-        else:
-            subgraph_features = torch.zeros(data.subgraph_features[indices].shape).to(device)
-        batch_node_features = None if node_features is None else node_features[curr_links]
-        logits = model.predictor(subgraph_features, batch_node_features, batch_emb)
-        preds.append(logits.view(-1).cpu())
-        if (batch_count + 1) * args.eval_batch_size > n_samples:
-            break
 
+    def run(eval_batch_size):
+        n_batches = (len(links) + eval_batch_size - 1) // eval_batch_size
+        n_preds = 0
+        for batch_count, indices in enumerate(tqdm(_batched_arange(len(links), eval_batch_size), total=n_batches)):
+            curr_links = links.index_select(0, indices).to(device, non_blocking=True)
+            flat_links = curr_links.view(-1)
+            batch_emb = None if emb is None else emb.index_select(0, flat_links).view(len(indices), 2, -1)
+            if args.use_struct_feature:
+                subgraph_features = model.elph_hashes.get_subgraph_features(curr_links, hashes, cards).to(device)
+            else:
+                # only the shape is needed, so don't materialise a gather just to read it
+                subgraph_features = torch.zeros((len(indices),) + data.subgraph_features.shape[1:], device=device)
+            batch_node_features = None if node_features is None else node_features.index_select(0, flat_links).view(
+                len(indices), 2, -1)
+            with amp_ctx:
+                logits = model.predictor(subgraph_features, batch_node_features, batch_emb)
+            n_preds = _stage_preds_to_host(logits, pred, n_preds, d2h_stream)
+            if (batch_count + 1) * eval_batch_size > n_samples:
+                break
+        return n_preds
+
+    # eval batch size should be the largest that fits on GPU
+    n_preds = _run_shrinking_on_oom(run, _get_eval_batch_size(data, args, device), args.eval_batch_size)
+    if d2h_stream is not None:
+        d2h_stream.synchronize()
     if args.wandb:
         wandb.log({f"inference_{split}_epoch_time": time.time() - t0})
-    pred = torch.cat(preds)
+    pred = pred[:n_preds]
     labels = labels[:len(pred)]
-    pos_pred = pred[labels == 1]
-    neg_pred = pred[labels == 0]
+    mask = _get_label_mask(data)[:len(pred)]
+    pos_pred = pred[mask]
+    neg_pred = pred[~mask]
     return pos_pred, neg_pred, pred, labels
+
+
+# model name -> prediction function, built once at import time so dispatch is a single dict lookup
+_TEST_FUNCS = {'ELPH': get_elph_preds, 'BUDDY': get_buddy_preds}
@@ -151,6 +151,8 @@ if __name__ == '__main__':
     parser.add_argument('--batch_size', type=int, default=1024)
     parser.add_argument('--eval_batch_size', type=int, default=1000000,
                         help='eval batch size should be largest the GPU memory can take - the same is not necessarily true at training time')
+    parser.add_argument('--eval_batch_size_max', type=int, default=10000000,
+                        help='cap on the eval batch size auto-tuned from free GPU memory')
     parser.add_argument('--label_dropout', type=float, default=0.5)
     parser.add_argument('--feature_dropout', type=float, default=0.5)
     parser.add_argument('--sign_dropout', type=float, default=0.5)
@@ -205,6 +207,10 @@ if __name__ == '__main__':
     parser.add_argument('--log_steps', type=int, default=1)
     parser.add_argument('--eval_metric', type=str, default='hits',
                         choices=('hits', 'mrr', 'auc'))
+    parser.add_argument('--torch_compile', type=str2bool, default=False,
+                        help='wrap the model with torch.compile(mode="reduce-overhead") at eval time')
+    parser.add_argument('--eval_bf16', type=str2bool, default=True,
+                        help='run eval forward passes under bf16 autocast on supporting GPUs')
     parser.add_argument('--K', type=int, default=100, help='the hit rate @K')
     # hash settings
     parser.add_argument('--use_zero_one', type=str2bool,
@@ -234,6 +240,8 @@ if __name__ == '__main__':
     parser.add_argument('--wandb_epoch_list', nargs='+', default=[0, 1, 2, 4, 8, 16],
                         help='list of epochs to log gradient flow')
     parser.add_argument('--log_features', action='store_true', help="log feature importance")
+    parser.add_argument('--profile_batches', action='store_true',
+                        help='collect per-batch timings during inference (adds a clock call to the hot loop)')
     args = parser.parse_args()
     if (args.max_hash_hops == 1) and (not args.use_zero_one):
         print("WARNING: (0,1) feature knock out is not supported for 1 hop. Running with all features")
@@ -138,8 +138,6 @@ def train(model, optimizer, train_loader, args, device, emb=None):
         loss.backward()
         optimizer.step()
         total_loss += loss.item() * args.batch_size
-        del data
-        torch.cuda.empty_cache()
         batch_processing_times.append(time.time() - start_time)
         if (batch_count + 1) * args.batch_size > train_samples:
             break
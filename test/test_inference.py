@@ -0,0 +1,77 @@
+"""
+tests for the inference functions
+"""
+
+import unittest
+from argparse import Namespace
+
+import torch
+from torch.utils.data import DataLoader
+
+from runners.inference import get_preds
+from test_params import OPT, setup_seed
+from models.elph import BUDDY
+from data import get_data, get_hashed_train_val_test_datasets
+
+
+class InferenceTests(unittest.TestCase):
+    def setUp(self):
+        setup_seed(0)
+
+    def _make_loader_and_model(self, args):
+        dataset, splits, _, _ = get_data(args)
+        train_data, val_data, test_data = splits['train'], splits['valid'], splits['test']
+        model = BUDDY(args, dataset.num_features)
+        model.eval()
+        _, _, test_dataset = get_hashed_train_val_test_datasets(dataset, train_data, val_data, test_data, args)
+        test_loader = DataLoader(test_dataset, batch_size=args.batch_size, shuffle=False,
+                                 num_workers=args.num_workers)
+        return model, test_loader
+
+    def _reference_preds(self, model, loader, device, n_samples):
+        # the old list + cat semantics that the preallocated buffer path must reproduce
+        y_pred, y_true = [], []
+        with torch.no_grad():
+            for batch_count, batch in enumerate(loader):
+                batch_dev = [elem.squeeze().to(device) for elem in batch]
+                y_pred.append(model(*batch_dev[:-1]).view(-1).cpu())
+                y_true.append(batch[-1].view(-1).to(torch.float))
+                if (batch_count + 1) * loader.batch_size > n_samples:
+                    break
+        return torch.cat(y_pred), torch.cat(y_true)
+
+    def test_get_preds(self):
+        # batch size deliberately does not divide the dataset so the final batch is partial
+        opt = {'dataset_name': 'Cora', 'cache_subgraph_features': True, 'batch_size': 33}
+        args = Namespace(**{**OPT, **opt})
+        args.model = 'BUDDY'
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        model, test_loader = self._make_loader_and_model(args)
+        pos_pred, neg_pred, pred, true = get_preds(model, test_loader, device, args, split='test')
+        ref_pred, ref_true = self._reference_preds(model, test_loader, device, len(test_loader.dataset))
+        self.assertEqual(len(pred), len(test_loader.dataset))
+        self.assertTrue(torch.allclose(pred, ref_pred))
+        self.assertTrue(torch.equal(true, ref_true))
+        self.assertEqual(len(pos_pred) + len(neg_pred), len(pred))
+        self.assertTrue(torch.allclose(pos_pred, ref_pred[ref_true == 1]))
+        self.assertTrue(torch.allclose(neg_pred, ref_pred[ref_true == 0]))
+
+    def test_get_preds_sample_break(self):
+        # dynamic_test with a small sample count triggers the early break mid-epoch
+        opt = {'dataset_name': 'Cora', 'cache_subgraph_features': True, 'batch_size': 33,
+               'dynamic_test': True, 'test_samples': 50}
+        args = Namespace(**{**OPT, **opt})
+        args.model = 'BUDDY'
+        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        model, test_loader = self._make_loader_and_model(args)
+        pos_pred, neg_pred, pred, true = get_preds(model, test_loader, device, args, split='test')
+        ref_pred, ref_true = self._reference_preds(model, test_loader, device, args.test_samples)
+        # the loop breaks after the first batch that crosses n_samples, so two batches are used
+        self.assertEqual(len(pred), 2 * args.batch_size)
+        self.assertTrue(torch.allclose(pred, ref_pred))
+        self.assertTrue(torch.equal(true, ref_true))
+        self.assertEqual(len(pos_pred) + len(neg_pred), len(pred))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,7 +20,8 @@ OPT = {'sample_size': None, 'dataset_name': 'Cora', 'num_hops': 2, 'max_dist': 1
        'sign_dropout': 0.5, 'use_struct_feature': True, 'max_hash_hops': 2, 'hll_p': 8,
        'minhash_num_perm': 128, 'floor_sf': False, 'year': 0, 'feature_prop': 'gcn', 'train_node_embeddings': False,
        'train_samples': inf, 'val_samples': inf, 'test_samples': inf, 'reps': 1, 'train_node_embedding': False,
-       'pretrained_node_embedding': False, 'max_z': 1000, 'eval_steps': 1, 'K': 100, 'save_model': False}
+       'pretrained_node_embedding': False, 'max_z': 1000, 'eval_steps': 1, 'K': 100, 'save_model': False,
+       'torch_compile': False, 'eval_bf16': True, 'profile_batches': False, 'eval_batch_size_max': 10000000}
 
 
 def setup_seed(seed):